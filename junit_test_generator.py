@@ -1,22 +1,186 @@
 import os
 import sys
+import hashlib
+import re
+import glob
+import threading
+from collections import deque
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
-import pyperclip
-import requests
-import json
 from dotenv import load_dotenv
-import threading
 
-# Load environment variables from .env file
-load_dotenv()
+# orjson is optional; fall back to the stdlib encoder/decoder when missing
+try:
+    from orjson import dumps as _json_dumps, loads as _json_loads
+except ImportError:
+    import json
+    
+    def _json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+    _json_loads = json.loads
+
+
+def _json_escape(text):
+    # Body of a JSON string literal, without the surrounding quotes
+    return _json_dumps(text)[1:-1]
+
+# Load environment variables from .env file unless the key is already set
+if not os.getenv("OPENAI_API_KEY"):
+    load_dotenv()
+
+# Matches the body of a ```java (or untagged ```) markdown code fence, running
+# to the end of the text when the closing fence was cut off
+_FENCE_RE = re.compile(r"```(?:java)?\s*\n?(.*?)(?:```|\Z)", re.DOTALL)
+
+# Matches the "=== FILE: <path> ===" lines separating files in a batch
+_FILE_DELIMITER_RE = re.compile(r"^=== FILE: (.+?) ===[ \t]*$", re.MULTILINE)
+
+# Full prompt skeleton; {java_code} is substituted in create_prompt
+_PROMPT_FULL = """
+[Context]
+I'm adding JUnit tests to an existing test class. I need comprehensive test methods for the following Java class.
+
+[Reference Documentation]
+Follow JUnit 5 best practices including:
+- @Test, @BeforeEach, @AfterEach annotations
+- Assertions from org.junit.jupiter.api.Assertions
+- Mockito for dependency mocking
+- Parameterized tests for multiple input combinations
+- Exception testing with assertThrows()
+
+[Specific Task]
+Analyze the Java class below and generate exhaustive JUnit 5 test methods (not the entire class) that achieve maximum code coverage.
+
+[Technical Requirements]
+1. Generate ONLY the test methods (no class declaration, imports, or package statements)
+2. Include test methods for ALL public methods
+3. Test ALL possible execution paths through each method
+4. Generate tests for the following scenarios for each method:
+   - Normal/expected inputs with correct results
+   - Edge cases (empty collections, null inputs, boundary values)
+   - Invalid inputs that should trigger exceptions
+   - All conditional branches (if/else, switch statements)
+   - For methods with loops, test: empty iterations, single iteration, multiple iterations
+5. For methods with dependencies:
+   - Assume mocks are already properly set up in the test class
+   - Set up mock behavior for different test scenarios
+   - Verify mock interactions where appropriate
+6. For methods with complex inputs:
+   - Create parameterized tests (@ParameterizedTest) with multiple combinations
+   - Test boundary conditions for numeric inputs
+   - Test empty, single-element, and multi-element collections
+7. Include private helper methods for test setup when needed
+
+[Desired Output Format]
+- Organize tests by method, with clear method naming: test[MethodName][Scenario]
+- Include descriptive Javadoc comments for each test method explaining what is being tested
+- Group related tests using nested test classes (@Nested) when appropriate
+- Include appropriate assertions for each test case
+- Assume all necessary imports are already present
+- Format code according to standard Java conventions
+
+[Java Class to Test]
+```java
+{java_code}
+```
+
+Please generate ONLY the test methods following this structure. Do not include class declaration, imports, or package statements. Assume the test class and all necessary imports already exist.
+"""
+
+# Appended to the prompt when several classes are sent in one request
+_BATCH_INSTRUCTIONS = """
+[Multiple Classes]
+The input above contains several Java classes, each introduced by a line of the form "=== FILE: <path> ===".
+Apply the instructions above to every class independently. For each class, output a line "=== FILE: <path> ===" with exactly the same path, followed by the test methods for that class in a ```java code block.
+"""
+
+# Compact prompt for small classes, where the full instructions would dwarf the code itself
+_PROMPT_SHORT = """
+Generate JUnit 5 test methods for every public method of the Java class below. Cover normal inputs, edge cases (null, empty, boundary values), exceptions with assertThrows(), and use @ParameterizedTest where several inputs apply. Mock dependencies with Mockito, assuming the mocks are already set up.
+Output ONLY the test methods, named test[MethodName][Scenario], in a ```java code block; no class declaration, imports, or package statements.
+
+```java
+{java_code}
+```
+"""
+
+# Classes shorter than this many characters use the short prompt
+_SHORT_PROMPT_MAX_CHARS = 1500
+
+# Static prompt text pre-escaped for splicing into the request body
+_PROMPT_FULL_HEAD_JSON, _PROMPT_FULL_TAIL_JSON = (_json_escape(part) for part in _PROMPT_FULL.split("{java_code}"))
+_PROMPT_SHORT_HEAD_JSON, _PROMPT_SHORT_TAIL_JSON = (_json_escape(part) for part in _PROMPT_SHORT.split("{java_code}"))
+_BATCH_INSTRUCTIONS_JSON = _json_escape(_BATCH_INSTRUCTIONS)
+
+# Request payload, pre-serialized around the prompt and max_tokens placeholders
+# so each request only has to escape the Java source itself
+_PAYLOAD_TEMPLATE = {
+    "model": "gpt-4o",
+    "messages": [
+        {"role": "system", "content": "You are an expert Java developer specializing in JUnit test creation."},
+        {"role": "user", "content": "<<prompt>>"}
+    ],
+    "temperature": 0.3,
+    "max_tokens": "<<max_tokens>>",
+    "stream": True
+}
+_BODY_HEAD, _BODY_MID, _BODY_TAIL = re.split(rb'<<prompt>>|"<<max_tokens>>"', _json_dumps(_PAYLOAD_TEMPLATE))
+
+# Directory and glob expansion leaves out test sources, which would otherwise get tests of their own
+_TEST_DIR_NAMES = {"test", "tests"}
+_TEST_FILE_SUFFIXES = ("Test.java", "Tests.java", "IT.java")
+
+# Ask before sending requests for more than this many uncached files
+_CONFIRM_FILE_COUNT = 10
+
+# Per-class completion budget derived from the input size, estimated at
+# 4 characters per token with tests running 6 times longer than the source.
+# _MAX_OUTPUT_TOKENS caps a single request (gpt-4o allows 16,384 completion
+# tokens), so a batch only forms when its files' budgets add up to no more
+# than that: up to seven small classes per request.
+_MIN_OUTPUT_TOKENS = 2048
+_MAX_OUTPUT_TOKENS = 16000
+_CHARS_PER_TOKEN = 4
+_OUTPUT_TOKENS_PER_INPUT_TOKEN = 6
+
+# Concurrent OpenAI requests, and retries on HTTP 429 before giving up
+_MAX_WORKERS = 8
+_MAX_RETRIES = 5
+
+# Size of the slices inserted into the output widget per idle callback
+_INSERT_CHUNK_SIZE = 1024
+
+# Minimum interval between scrolls to the end of the output while text streams in
+_SCROLL_INTERVAL_MS = 50
+
+class OpenAIAPIError(Exception):
+    pass
+
+
+class GenerationCancelled(Exception):
+    pass
+
 
 class JUnitTestGenerator:
     def __init__(self, root):
         self.root = root
         self.root.title("JUnit Test Generator")
         self.root.geometry("800x600")
+        self._insert_queue = deque()
+        self._drain_scheduled = False
+        self._copy_when_drained = False
+        self._pending_scroll = False
+        self._closing = False
+        self._responses = set()
+        self._request_slots = None
+        self.cache_dir = os.path.expanduser("~/.junitgpt/cache")
+        
+        # The event loop and executor are started by the first generation so asyncio
+        # and concurrent.futures are not imported before the window paints
+        self.loop = None
+        self.executor = None
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Get API key from environment variables
         self.api_key = os.getenv("OPENAI_API_KEY")
@@ -24,6 +188,9 @@ class JUnitTestGenerator:
             messagebox.showerror("Error", "OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
             self.root.destroy()
             sys.exit(1)
+        
+        # The HTTP session is created on first use so requests is not imported at startup
+        self.session = None
     
     def setup_ui(self):
         # Frame for input elements
@@ -31,7 +198,7 @@ class JUnitTestGenerator:
         input_frame.pack(fill=tk.X)
         
         # Path input label and entry
-        path_label = tk.Label(input_frame, text="Java File Path:")
+        path_label = tk.Label(input_frame, text="Java File, Directory or Glob:")
         path_label.pack(side=tk.LEFT)
         
         self.path_entry = tk.Entry(input_frame, width=60)
@@ -41,6 +208,11 @@ class JUnitTestGenerator:
         self.generate_button = tk.Button(input_frame, text="Generate JUnit Tests", command=self.generate_tests)
         self.generate_button.pack(side=tk.RIGHT, padx=5)
         
+        # Cache bypass checkbox (results are still written to the cache)
+        self.no_cache_var = tk.BooleanVar(value=False)
+        no_cache_check = tk.Checkbutton(input_frame, text="No cache", variable=self.no_cache_var)
+        no_cache_check.pack(side=tk.RIGHT)
+        
         # Output area
         output_frame = tk.Frame(self.root, padx=10, pady=5)
         output_frame.pack(fill=tk.BOTH, expand=True)
@@ -58,98 +230,421 @@ class JUnitTestGenerator:
         self.copy_button.pack(pady=5)
         self.copy_button.config(state=tk.DISABLED)
     
-    def read_java_file(self, file_path):
+    def read_java_file(self, file_path, size=-1):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return file.read(size)
+    
+    def expand_paths(self, path_spec):
+        # A directory or glob pattern selects every matching .java file except test sources
+        if os.path.isdir(path_spec):
+            pattern = os.path.join(path_spec, "**", "*.java")
+        elif any(c in path_spec for c in "*?["):
+            pattern = path_spec
+        else:
+            return [path_spec]
+        return sorted(
+            p for p in glob.glob(pattern, recursive=True)
+            if p.endswith('.java') and not self.is_test_source(p)
+        )
+    
+    def is_test_source(self, file_path):
+        parts = os.path.normpath(file_path).split(os.sep)
+        return parts[-1].endswith(_TEST_FILE_SUFFIXES) or any(part in _TEST_DIR_NAMES for part in parts[:-1])
+    
+    def load_java_file(self, file_path):
+        # Returns (java_code, error_message); java_code is None when the file can't be used
+        if not file_path.endswith('.java'):
+            return None, "The file must be a Java file (.java)"
+        
+        # A single stat validates the path and sizes the read buffer
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            return None, f"File not found: {file_path}"
+        except OSError as e:
+            return None, f"Failed to read file: {str(e)}"
+        
+        try:
+            java_code = self.read_java_file(file_path, st.st_size)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to read file: {str(e)}")
-            return None
+            return None, f"Failed to read file: {str(e)}"
+        
+        if not java_code:
+            return None, f"File is empty: {file_path}"
+        return java_code, None
     
     def generate_tests(self):
-        file_path = self.path_entry.get().strip()
+        path_spec = self.path_entry.get().strip()
         
-        if not file_path:
+        if not path_spec:
             messagebox.showerror("Error", "Please provide a valid file path")
             return
         
-        if not os.path.exists(file_path):
-            messagebox.showerror("Error", f"File not found: {file_path}")
+        file_paths = self.expand_paths(path_spec)
+        if not file_paths:
+            messagebox.showerror("Error", f"No Java files found: {path_spec}")
             return
         
-        if not file_path.endswith('.java'):
-            messagebox.showerror("Error", "The file must be a Java file (.java)")
+        # A single file aborts on error; in batches bad files are skipped and reported in the output
+        sources = []
+        results = {}
+        for file_path in file_paths:
+            java_code, error_message = self.load_java_file(file_path)
+            if java_code is None:
+                if len(file_paths) == 1:
+                    messagebox.showerror("Error", error_message)
+                    return
+                results[file_path] = f"// Skipped: {error_message}"
+                continue
+            sources.append((file_path, java_code))
+            results[file_path] = None
+        
+        if not sources:
+            messagebox.showerror("Error", f"No readable Java files found: {path_spec}")
             return
         
-        java_code = self.read_java_file(file_path)
-        if not java_code:
+        # Decide up front whether the files share one batch prompt, so cache lookups
+        # and writes agree on which prompt variant produced each result
+        batched = len(sources) > 1 and sum(self.estimate_max_tokens(len(java_code)) for _, java_code in sources) <= _MAX_OUTPUT_TOKENS
+        
+        # Serve identical inputs from the on-disk cache
+        if not self.no_cache_var.get():
+            for file_path, java_code in sources:
+                results[file_path] = self.read_cache(java_code, self.prompt_variant(java_code, batched))
+        
+        pending = [(file_path, java_code) for file_path, java_code in sources if results[file_path] is None]
+        if not pending:
+            self.update_ui_with_result(self.format_results(results))
+            self.status_label.config(text="Tests loaded from cache!")
             return
         
+        # Every uncached file is a paid API request, so large selections need confirmation
+        if len(pending) > _CONFIRM_FILE_COUNT:
+            if not messagebox.askyesno(
+                "Confirm",
+                f"{len(pending)} of {len(file_paths)} Java files need new tests and will be sent to OpenAI. Continue?"
+            ):
+                self.status_label.config(text="Ready")
+                return
+        
         # Clear output and disable buttons
-        self.output_text.delete(1.0, tk.END)
+        self.clear_output()
         self.generate_button.config(state=tk.DISABLED)
         self.copy_button.config(state=tk.DISABLED)
-        self.status_label.config(text="Generating tests...")
-        self.root.update()
+        self.status_label.config(text=f"Generating tests for {len(pending)} file{'s' if len(pending) != 1 else ''}...")
+        self.root.update_idletasks()
+        
+        # Make the API calls off the UI thread
+        import asyncio
         
-        # Create a thread to make the API call
-        thread = threading.Thread(target=self.call_openai_api, args=(java_code, file_path))
-        thread.daemon = True
-        thread.start()
+        if self.loop is None:
+            self.start_workers()
+        asyncio.run_coroutine_threadsafe(self.call_openai_api(pending, results, batched), self.loop)
     
-    def call_openai_api(self, java_code, file_path):
+    def start_workers(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        
+        # One long-lived event loop schedules every generation; blocking HTTP runs on the executor
+        self.executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+    
+    async def call_openai_api(self, sources, results, batched):
+        import asyncio
+        
         try:
-            prompt = self.create_prompt(java_code)
+            if self.session is None:
+                self.session = self.create_session()
             
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
+            errors = {}
+            incomplete = {}
+            if batched:
+                # Several files are packed into a single request to share the prompt and round trip
+                max_tokens = sum(self.estimate_max_tokens(len(java_code)) for _, java_code in sources)
+                text, finish_reason = await self._acall(self.create_batch_prompt(sources), max_tokens, stream_to_ui=True)
+                generated = self.split_batch_response(text)
+                if finish_reason != "stop" and generated:
+                    # Only the last section can have been cut off; drop it so that file is retried
+                    generated.popitem()
+                retry = [(file_path, java_code) for file_path, java_code in sources if file_path not in generated]
+            elif len(sources) == 1:
+                file_path, java_code = sources[0]
+                prompt = self.create_prompt(java_code, self.prompt_variant(java_code, batched))
+                text, finish_reason = await self._acall(prompt, self.estimate_max_tokens(len(java_code)), stream_to_ui=True)
+                generated = {file_path: self.extract_code(text)}
+                if finish_reason != "stop":
+                    incomplete[file_path] = finish_reason
+                retry = []
+            else:
+                generated = {}
+                retry = sources
             
-            payload = {
-                "model": "gpt-4o",
-                "messages": [
-                    {"role": "system", "content": "You are an expert Java developer specializing in JUnit test creation."},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 4000
-            }
+            if retry:
+                # Files that didn't fit a batch, or that a batch didn't return in full, get their own
+                # concurrent requests with the prompt variant their cache entry is keyed on
+                tasks = [self._do_one(file_path, java_code, self.prompt_variant(java_code, batched)) for file_path, java_code in retry]
+                for done, task in enumerate(asyncio.as_completed(tasks), 1):
+                    file_path, test_code, finish_reason, error = await task
+                    if error is None:
+                        generated[file_path] = test_code
+                        if finish_reason != "stop":
+                            incomplete[file_path] = finish_reason
+                    else:
+                        errors[file_path] = error
+                    status = f"Generated tests for {done}/{len(retry)} files..."
+                    self._run_on_ui(lambda text=status: self.status_label.config(text=text))
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                data=json.dumps(payload)
-            )
+            if self._closing:
+                return
             
-            if response.status_code == 200:
-                response_json = response.json()
-                test_code = response_json['choices'][0]['message']['content']
-                
-                # Extract code from markdown if present
-                if "```java" in test_code:
-                    test_code = test_code.split("```java")[1]
-                    if "```" in test_code:
-                        test_code = test_code.split("```")[0]
+            for file_path, java_code in sources:
+                test_code = generated.get(file_path)
+                if file_path in errors:
+                    # Failures are shown but never cached
+                    results[file_path] = f"// Failed to generate tests: {errors[file_path]}"
+                elif test_code is None:
+                    results[file_path] = "// No tests were returned for this file"
+                elif file_path in incomplete:
+                    # Output that didn't finish normally is shown but never cached
+                    reason = incomplete[file_path] or "none"
+                    results[file_path] = f"// Output is incomplete (finish_reason: {reason}) and was not cached\n{test_code}"
+                else:
+                    self.write_cache(java_code, self.prompt_variant(java_code, batched), test_code)
+                    results[file_path] = test_code
+            
+            # Update UI in the main thread
+            self._run_on_ui(self.update_ui_with_result, self.format_results(results))
                 
-                # Update UI in the main thread
-                self.root.after(0, self.update_ui_with_result, test_code.strip())
-            else:
+        except OpenAIAPIError as e:
+            self.report_failure(sources, results, str(e))
+        except Exception as e:
+            self.report_failure(sources, results, f"Error: {str(e)}")
+    
+    def report_failure(self, sources, results, error_message):
+        # A lone file shows the bare error; otherwise cached results and skip notes stay visible
+        if len(results) == 1:
+            self._run_on_ui(self.show_error, error_message)
+            return
+        for file_path, _ in sources:
+            if results[file_path] is None:
+                results[file_path] = f"// Failed to generate tests: {error_message}"
+        self._run_on_ui(self.update_ui_with_result, self.format_results(results), "Error occurred")
+    
+    def create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        # Reuse one HTTP session so the TLS connection is kept alive between generations
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=_MAX_WORKERS))
+        session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        })
+        return session
+    
+    async def _do_one(self, file_path, java_code, variant):
+        # Returns (file_path, test_code, finish_reason, error); test_code is None when the request failed
+        try:
+            text, finish_reason = await self._acall(self.create_prompt(java_code, variant), self.estimate_max_tokens(len(java_code)))
+            return file_path, self.extract_code(text), finish_reason, None
+        except Exception as e:
+            return file_path, None, None, str(e)
+    
+    async def _acall(self, prompt, max_tokens, stream_to_ui=False):
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        body = b"".join([_BODY_HEAD, *prompt, _BODY_MID, str(max_tokens).encode('ascii'), _BODY_TAIL])
+        
+        # Each request holds a slot from its first POST until its stream is read, so at most
+        # _MAX_WORKERS requests are in flight and no response sits unread behind queued POSTs
+        if self._request_slots is None:
+            self._request_slots = asyncio.Semaphore(_MAX_WORKERS)
+        
+        async with self._request_slots:
+            # Back off on rate limiting, honouring Retry-After when the API sends it
+            for attempt in range(_MAX_RETRIES + 1):
+                response = await loop.run_in_executor(self.executor, self._post, body)
+                if response.status_code != 429 or attempt == _MAX_RETRIES or self._closing:
+                    break
+                try:
+                    delay = float(response.headers.get("Retry-After"))
+                except (TypeError, ValueError):
+                    delay = 2 ** attempt
+                self._responses.discard(response)
+                response.close()
+                await asyncio.sleep(delay)
+            
+            if response.status_code != 200:
                 error_message = f"API Error: {response.status_code}\n{response.text}"
-                self.root.after(0, self.show_error, error_message)
+                self._responses.discard(response)
+                response.close()
+                raise OpenAIAPIError(error_message)
+            
+            return await loop.run_in_executor(self.executor, self._read_stream, response, stream_to_ui)
+    
+    def estimate_max_tokens(self, source_chars):
+        # Completion budget for one class; a batch gets the sum of its files' budgets
+        est_in = source_chars // _CHARS_PER_TOKEN
+        return min(_MAX_OUTPUT_TOKENS, max(_MIN_OUTPUT_TOKENS, est_in * _OUTPUT_TOKENS_PER_INPUT_TOKEN))
+    
+    def _post(self, body):
+        response = self.session.post(
+            "https://api.openai.com/v1/chat/completions",
+            data=body,
+            stream=True,
+            timeout=(5, 120)
+        )
+        self._responses.add(response)
+        return response
+    
+    def _read_stream(self, response, stream_to_ui):
+        # Parse Server-Sent Events, optionally rendering tokens as they arrive.
+        # Returns (text, finish_reason); anything other than "stop" means the output is incomplete.
+        buffer = []
+        finish_reason = None
+        try:
+            for line in response.iter_lines():
+                if self._closing:
+                    raise GenerationCancelled("Generation cancelled because the window was closed")
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[len(b"data: "):]
+                if data == b"[DONE]":
+                    break
                 
-        except Exception as e:
-            self.root.after(0, self.show_error, f"Error: {str(e)}")
+                chunk_json = _json_loads(data)
+                if not chunk_json.get('choices'):
+                    continue
+                choice = chunk_json['choices'][0]
+                finish_reason = choice.get('finish_reason') or finish_reason
+                chunk = choice['delta'].get('content')
+                if chunk:
+                    buffer.append(chunk)
+                    if stream_to_ui:
+                        self._run_on_ui(self._append_delta, chunk)
+        finally:
+            self._responses.discard(response)
+            response.close()
+        
+        return "".join(buffer), finish_reason
+    
+    def extract_code(self, text):
+        # Extract code from markdown if present
+        m = _FENCE_RE.search(text)
+        return (m.group(1) if m else text).strip()
+    
+    def split_batch_response(self, text):
+        # re.split yields [preamble, path1, body1, path2, body2, ...]
+        parts = _FILE_DELIMITER_RE.split(text)
+        return {
+            path.strip(): self.extract_code(body)
+            for path, body in zip(parts[1::2], parts[2::2])
+        }
+    
+    def format_results(self, results):
+        if len(results) == 1:
+            return next(iter(results.values()))
+        return "\n\n".join(f"// === FILE: {file_path} ===\n{test_code}" for file_path, test_code in results.items())
     
-    def update_ui_with_result(self, test_code):
+    def get_cache_path(self, java_code, variant):
+        key = hashlib.sha256(java_code.encode('utf-8') + f"|gpt-4o|v2|{variant}".encode('ascii')).hexdigest()
+        return os.path.join(self.cache_dir, key)
+    
+    def read_cache(self, java_code, variant):
+        try:
+            with open(self.get_cache_path(java_code, variant), 'r', encoding='utf-8') as file:
+                return file.read()
+        except OSError:
+            return None
+    
+    def write_cache(self, java_code, variant, test_code):
+        cache_path = self.get_cache_path(java_code, variant)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.write(test_code)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # A failed cache write should never break test generation
+            pass
+    
+    def _run_on_ui(self, callback, *args):
+        # Worker threads hand results to Tk here; nothing is scheduled once the window is closing
+        if self._closing:
+            return
+        try:
+            self.root.after(0, callback, *args)
+        except (RuntimeError, tk.TclError):
+            pass
+    
+    def on_close(self):
+        # Abort in-flight requests so pending executor work can't keep the process alive
+        self._closing = True
+        for response in list(self._responses):
+            response.close()
+        if self.session is not None:
+            self.session.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.root.destroy()
+    
+    def _append_delta(self, chunk):
+        # Streamed deltas are already small, so insert directly and only throttle scrolling
+        self.output_text.insert(tk.END, chunk)
+        self._schedule_scroll()
+    
+    def _schedule_scroll(self):
+        if not self._pending_scroll:
+            self._pending_scroll = True
+            self.root.after(_SCROLL_INTERVAL_MS, self._flush_scroll)
+    
+    def _flush_scroll(self):
+        self.output_text.see(tk.END)
+        self._pending_scroll = False
+    
+    def enqueue_output(self, text):
+        # Insert large blocks in slices so Tk never re-lays out everything in one go
+        for start in range(0, len(text), _INSERT_CHUNK_SIZE):
+            self._insert_queue.append(text[start:start + _INSERT_CHUNK_SIZE])
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            self.root.after_idle(self._drain_output_queue)
+    
+    def _drain_output_queue(self):
+        if self._insert_queue:
+            self.output_text.insert(tk.END, self._insert_queue.popleft())
+            self.output_text.update_idletasks()
+        if self._insert_queue:
+            self.root.after_idle(self._drain_output_queue)
+        else:
+            self._drain_scheduled = False
+            self._schedule_scroll()
+            # Only offer copying once the whole result is in the widget
+            if self._copy_when_drained:
+                self._copy_when_drained = False
+                self.copy_button.config(state=tk.NORMAL)
+    
+    def clear_output(self):
+        self._insert_queue.clear()
+        self._copy_when_drained = False
         self.output_text.delete(1.0, tk.END)
-        self.output_text.insert(tk.END, test_code)
+    
+    def update_ui_with_result(self, test_code, status="Tests generated successfully!"):
+        self.clear_output()
+        self.copy_button.config(state=tk.DISABLED)
+        self._copy_when_drained = True
+        self.enqueue_output(test_code)
         self.generate_button.config(state=tk.NORMAL)
-        self.copy_button.config(state=tk.NORMAL)
-        self.status_label.config(text="Tests generated successfully!")
+        self.status_label.config(text=status)
     
     def show_error(self, error_message):
-        self.output_text.delete(1.0, tk.END)
+        self.clear_output()
         self.output_text.insert(tk.END, error_message)
         self.generate_button.config(state=tk.NORMAL)
         self.copy_button.config(state=tk.DISABLED)
@@ -157,62 +652,28 @@ class JUnitTestGenerator:
     
     def copy_to_clipboard(self):
         test_code = self.output_text.get(1.0, tk.END)
-        pyperclip.copy(test_code)
+        self.root.clipboard_clear()
+        self.root.clipboard_append(test_code)
+        # Some platforms only publish the clipboard once Tk processes events
+        self.root.update()
         self.status_label.config(text="Copied to clipboard!")
         self.root.after(2000, lambda: self.status_label.config(text="Ready"))
     
-    def create_prompt(self, java_code):
-        prompt = f"""
-[Context]
-I'm adding JUnit tests to an existing test class. I need comprehensive test methods for the following Java class.
-
-[Reference Documentation]
-Follow JUnit 5 best practices including:
-- @Test, @BeforeEach, @AfterEach annotations
-- Assertions from org.junit.jupiter.api.Assertions
-- Mockito for dependency mocking
-- Parameterized tests for multiple input combinations
-- Exception testing with assertThrows()
-
-[Specific Task]
-Analyze the Java class below and generate exhaustive JUnit 5 test methods (not the entire class) that achieve maximum code coverage.
-
-[Technical Requirements]
-1. Generate ONLY the test methods (no class declaration, imports, or package statements)
-2. Include test methods for ALL public methods
-3. Test ALL possible execution paths through each method
-4. Generate tests for the following scenarios for each method:
-   - Normal/expected inputs with correct results
-   - Edge cases (empty collections, null inputs, boundary values)
-   - Invalid inputs that should trigger exceptions
-   - All conditional branches (if/else, switch statements)
-   - For methods with loops, test: empty iterations, single iteration, multiple iterations
-5. For methods with dependencies:
-   - Assume mocks are already properly set up in the test class
-   - Set up mock behavior for different test scenarios
-   - Verify mock interactions where appropriate
-6. For methods with complex inputs:
-   - Create parameterized tests (@ParameterizedTest) with multiple combinations
-   - Test boundary conditions for numeric inputs
-   - Test empty, single-element, and multi-element collections
-7. Include private helper methods for test setup when needed
-
-[Desired Output Format]
-- Organize tests by method, with clear method naming: test[MethodName][Scenario]
-- Include descriptive Javadoc comments for each test method explaining what is being tested
-- Group related tests using nested test classes (@Nested) when appropriate
-- Include appropriate assertions for each test case
-- Assume all necessary imports are already present
-- Format code according to standard Java conventions
-
-[Java Class to Test]
-```java
-{java_code}
-```
-
-Please generate ONLY the test methods following this structure. Do not include class declaration, imports, or package statements. Assume the test class and all necessary imports already exist.
-"""
-        return prompt
+    def prompt_variant(self, java_code, batched):
+        # Batches always use the full prompt; single requests use the short one for small classes
+        if batched or len(java_code) >= _SHORT_PROMPT_MAX_CHARS:
+            return "full"
+        return "short"
+    
+    # Prompts are returned as JSON-escaped byte segments that _acall splices into the request body
+    def create_prompt(self, java_code, variant):
+        if variant == "short":
+            return [_PROMPT_SHORT_HEAD_JSON, _json_escape(java_code), _PROMPT_SHORT_TAIL_JSON]
+        return [_PROMPT_FULL_HEAD_JSON, _json_escape(java_code), _PROMPT_FULL_TAIL_JSON]
+    
+    def create_batch_prompt(self, sources):
+        files = "".join(f"=== FILE: {file_path} ===\n{java_code}\n" for file_path, java_code in sources)
+        return [_PROMPT_FULL_HEAD_JSON, _json_escape(files), _PROMPT_FULL_TAIL_JSON, _BATCH_INSTRUCTIONS_JSON]
 
 
 if __name__ == "__main__":